@@ -6,6 +6,9 @@ from pathlib import Path
 # Database path
 DB_PATH = Path(__file__).parent / "fraud_cases.db"
 
+# Format used for transactionTime values
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
 def init_database():
     """Create database and populate with sample fraud cases"""
     conn = sqlite3.connect(DB_PATH)
@@ -33,10 +36,17 @@ def init_database():
         )
     """)
     
+    # Index the case-insensitive name lookup so it doesn't scan every row
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_cases_username_lower
+        ON fraud_cases(LOWER(userName), case_status)
+    """)
+    
     # Clear existing data for fresh start
     cursor.execute("DELETE FROM fraud_cases")
     
-    # Sample fraud cases
+    # Sample fraud cases (transaction times are relative to a single clock read)
+    now = datetime.now()
     fraud_cases = [
         {
             "userName": "Rajesh Kumar",
@@ -44,7 +54,7 @@ def init_database():
             "cardEnding": "4242",
             "transactionName": "Global Electronics Ltd",
             "transactionAmount": 45999.00,
-            "transactionTime": (datetime.now() - timedelta(hours=2)).strftime("%Y-%m-%d %H:%M:%S"),
+            "transactionTime": (now - timedelta(hours=2)).strftime(TIME_FORMAT),
             "transactionCategory": "electronics",
             "transactionSource": "alibaba.com",
             "transactionLocation": "Shanghai, China",
@@ -57,7 +67,7 @@ def init_database():
             "cardEnding": "8765",
             "transactionName": "Luxury Fashion Store",
             "transactionAmount": 89500.00,
-            "transactionTime": (datetime.now() - timedelta(hours=5)).strftime("%Y-%m-%d %H:%M:%S"),
+            "transactionTime": (now - timedelta(hours=5)).strftime(TIME_FORMAT),
             "transactionCategory": "fashion",
             "transactionSource": "luxuryfashion.ru",
             "transactionLocation": "Moscow, Russia",
@@ -70,7 +80,7 @@ def init_database():
             "cardEnding": "3456",
             "transactionName": "Tech Gadgets Inc",
             "transactionAmount": 125000.00,
-            "transactionTime": (datetime.now() - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S"),
+            "transactionTime": (now - timedelta(hours=1)).strftime(TIME_FORMAT),
             "transactionCategory": "electronics",
             "transactionSource": "techgadgets.com",
             "transactionLocation": "Lagos, Nigeria",
@@ -83,7 +93,7 @@ def init_database():
             "cardEnding": "7890",
             "transactionName": "Online Gaming Credits",
             "transactionAmount": 15000.00,
-            "transactionTime": (datetime.now() - timedelta(minutes=30)).strftime("%Y-%m-%d %H:%M:%S"),
+            "transactionTime": (now - timedelta(minutes=30)).strftime(TIME_FORMAT),
             "transactionCategory": "gaming",
             "transactionSource": "gamecredits.xyz",
             "transactionLocation": "Manila, Philippines",
@@ -96,7 +106,7 @@ def init_database():
             "cardEnding": "5521",
             "transactionName": "Cryptocurrency Exchange",
             "transactionAmount": 250000.00,
-            "transactionTime": (datetime.now() - timedelta(hours=3)).strftime("%Y-%m-%d %H:%M:%S"),
+            "transactionTime": (now - timedelta(hours=3)).strftime(TIME_FORMAT),
             "transactionCategory": "crypto",
             "transactionSource": "cryptoexchange.io",
             "transactionLocation": "Dubai, UAE",
@@ -109,7 +119,7 @@ def init_database():
             "cardEnding": "2289",
             "transactionName": "Premium Software Subscription",
             "transactionAmount": 35000.00,
-            "transactionTime": (datetime.now() - timedelta(hours=6)).strftime("%Y-%m-%d %H:%M:%S"),
+            "transactionTime": (now - timedelta(hours=6)).strftime(TIME_FORMAT),
             "transactionCategory": "software",
             "transactionSource": "premiumsoft.xyz",
             "transactionLocation": "Singapore",
@@ -122,7 +132,7 @@ def init_database():
             "cardEnding": "1122",
             "transactionName": "International Money Transfer",
             "transactionAmount": 180000.00,
-            "transactionTime": (datetime.now() - timedelta(hours=4)).strftime("%Y-%m-%d %H:%M:%S"),
+            "transactionTime": (now - timedelta(hours=4)).strftime(TIME_FORMAT),
             "transactionCategory": "transfer",
             "transactionSource": "moneytransfer.net",
             "transactionLocation": "London, UK",
@@ -135,7 +145,7 @@ def init_database():
             "cardEnding": "9988",
             "transactionName": "Premium Watch Store",
             "transactionAmount": 275000.00,
-            "transactionTime": (datetime.now() - timedelta(hours=7)).strftime("%Y-%m-%d %H:%M:%S"),
+            "transactionTime": (now - timedelta(hours=7)).strftime(TIME_FORMAT),
             "transactionCategory": "luxury",
             "transactionSource": "luxurywatches.com",
             "transactionLocation": "Geneva, Switzerland",
@@ -148,7 +158,7 @@ def init_database():
             "cardEnding": "3344",
             "transactionName": "Online Betting Platform",
             "transactionAmount": 95000.00,
-            "transactionTime": (datetime.now() - timedelta(minutes=45)).strftime("%Y-%m-%d %H:%M:%S"),
+            "transactionTime": (now - timedelta(minutes=45)).strftime(TIME_FORMAT),
             "transactionCategory": "gambling",
             "transactionSource": "betking.online",
             "transactionLocation": "Malta",
@@ -161,7 +171,7 @@ def init_database():
             "cardEnding": "6677",
             "transactionName": "Designer Clothing Store",
             "transactionAmount": 145000.00,
-            "transactionTime": (datetime.now() - timedelta(hours=8)).strftime("%Y-%m-%d %H:%M:%S"),
+            "transactionTime": (now - timedelta(hours=8)).strftime(TIME_FORMAT),
             "transactionCategory": "fashion",
             "transactionSource": "designerfashion.it",
             "transactionLocation": "Milan, Italy",
@@ -170,30 +180,25 @@ def init_database():
         }
     ]
     
-    # Insert fraud cases
-    for case in fraud_cases:
-        cursor.execute("""
-            INSERT INTO fraud_cases (
-                userName, securityIdentifier, cardEnding, transactionName,
-                transactionAmount, transactionTime, transactionCategory,
-                transactionSource, transactionLocation, securityQuestion, securityAnswer
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            case["userName"], case["securityIdentifier"], case["cardEnding"],
-            case["transactionName"], case["transactionAmount"], case["transactionTime"],
-            case["transactionCategory"], case["transactionSource"], case["transactionLocation"],
-            case["securityQuestion"], case["securityAnswer"]
-        ))
+    # Insert fraud cases in one statement batch - a single transaction and commit
+    cursor.executemany("""
+        INSERT INTO fraud_cases (
+            userName, securityIdentifier, cardEnding, transactionName,
+            transactionAmount, transactionTime, transactionCategory,
+            transactionSource, transactionLocation, securityQuestion, securityAnswer
+        ) VALUES (
+            :userName, :securityIdentifier, :cardEnding, :transactionName,
+            :transactionAmount, :transactionTime, :transactionCategory,
+            :transactionSource, :transactionLocation, :securityQuestion, :securityAnswer
+        )
+    """, fraud_cases)
     
     conn.commit()
-    conn.close()
     
     print(f"✅ Database initialized at: {DB_PATH}")
     print(f"✅ Created {len(fraud_cases)} fraud cases")
     
-    # Display the cases
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    # Display the cases (same connection - no need to reopen the file)
     cursor.execute("SELECT id, userName, cardEnding, transactionName, transactionAmount, case_status FROM fraud_cases")
     rows = cursor.fetchall()
     
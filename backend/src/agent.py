@@ -1,9 +1,11 @@
+import asyncio
 import logging
 import json
 from pathlib import Path
 from datetime import datetime
 from typing import Annotated
 import random
+import time
 
 from dotenv import load_dotenv
 from livekit.agents import (
@@ -47,250 +49,282 @@ SCENARIOS = [
     "You are a master thief planning an elaborate heist with your crew, but your plan has one obvious flaw everyone keeps pointing out."
 ]
 
-# Game state storage
-GAME_SESSIONS = {}
+# Host reaction tones - must match the styles described in HOST_INSTRUCTIONS
+REACTION_STYLES = (
+    "positive_enthusiastic",
+    "positive_mild",
+    "critical_constructive",
+    "mixed",
+    "surprised",
+)
 
 # Session storage directory
 SESSIONS_DIR = Path(__file__).parent.parent / "shared-data" / "improv_sessions"
-SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def get_game_state(session_id: str) -> dict:
-    """Get or create game state for a session"""
-    if session_id not in GAME_SESSIONS:
-        GAME_SESSIONS[session_id] = {
-            "player_name": None,
-            "current_round": 0,
-            "max_rounds": 3,
-            "rounds": [],
-            "phase": "intro",
-            "current_scenario": None,
-            "session_start": datetime.now().isoformat()
-        }
-    return GAME_SESSIONS[session_id]
-
-
-def save_session(session_id: str):
-    """Save session to file"""
+
+
+class RoundResult:
+    """Outcome of a single improv round"""
+    
+    __slots__ = ("performance_summary", "reaction_style", "round_number", "scenario")
+    
+    # Keys written for each round in the session file, in this order
+    PERSISTED_FIELDS = ("round_number", "scenario", "performance_summary", "reaction_style")
+    
+    def __init__(
+        self,
+        round_number: int,
+        scenario: str,
+        performance_summary: str,
+        reaction_style: str,
+    ) -> None:
+        self.round_number = round_number
+        self.scenario = scenario
+        self.performance_summary = performance_summary
+        self.reaction_style = reaction_style
+    
+    def to_dict(self) -> dict:
+        """Plain-dict view of the round for persistence"""
+        return {name: getattr(self, name) for name in self.PERSISTED_FIELDS}
+
+
+class GameState:
+    """Per-session improv game state (held in the session's userdata)"""
+    
+    __slots__ = (
+        "current_round",
+        "current_scenario",
+        "max_rounds",
+        "phase",
+        "player_name",
+        "rounds",
+        "save_lock",
+        "scenario_order",
+        "session_id",
+        "session_start",
+    )
+    
+    # Keys written to the session file, in this order. session_id (already in the
+    # file name), save_lock and scenario_order stay in memory only.
+    PERSISTED_FIELDS = (
+        "player_name",
+        "current_round",
+        "max_rounds",
+        "rounds",
+        "phase",
+        "current_scenario",
+        "session_start",
+    )
+    
+    def __init__(self, session_id: str, max_rounds: int = 3) -> None:
+        if not 1 <= max_rounds <= len(SCENARIOS):
+            raise ValueError(f"max_rounds must be between 1 and {len(SCENARIOS)}, got {max_rounds}")
+        self.session_id = session_id
+        self.player_name = None
+        self.current_round = 0
+        self.max_rounds = max_rounds
+        # Draw every round's scenario up front - distinct, no per-round filtering
+        self.scenario_order = random.sample(SCENARIOS, max_rounds)
+        self.rounds = []
+        self.phase = "intro"
+        self.current_scenario = None
+        self.session_start = datetime.now().isoformat()
+        # Tools from one LLM turn run concurrently; saves must not overlap on the same file
+        self.save_lock = asyncio.Lock()
+    
+    def to_dict(self) -> dict:
+        """Plain-dict view of the state for persistence"""
+        data = {name: getattr(self, name) for name in self.PERSISTED_FIELDS}
+        data["rounds"] = [round_data.to_dict() for round_data in self.rounds]
+        return data
+
+
+def _write_session(filepath: Path, payload: str):
+    """Write a serialized session to disk (runs in a worker thread)"""
+    filepath.write_text(payload, encoding="utf-8")
+
+
+async def save_session(state: GameState):
+    """Save session to file without blocking the event loop"""
     try:
-        state = GAME_SESSIONS.get(session_id)
-        if state:
-            filepath = SESSIONS_DIR / f"session_{session_id}.json"
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(state, f, indent=2, ensure_ascii=False)
-            logger.info(f"Session {session_id} saved to {filepath}")
+        filepath = SESSIONS_DIR / f"session_{state.session_id}.json"
+        # Snapshot under the lock too, so a later save never lands before an earlier one
+        async with state.save_lock:
+            # Serialize on the loop so the snapshot can't change mid-write
+            payload = json.dumps(state.to_dict(), separators=(",", ":"), ensure_ascii=False)
+            await asyncio.to_thread(_write_session, filepath, payload)
+        logger.info("Session %s saved to %s", state.session_id, filepath)
     except Exception as e:
-        logger.error(f"Error saving session: {e}")
+        logger.error("Error saving session: %s", e)
 
 
 @function_tool()
 async def start_game(
-    context: RunContext,
+    context: RunContext[GameState],
     player_name: Annotated[str, "The player's name"]
 ) -> str:
     """Start the improv game with player name"""
     
-    logger.info(f"=== start_game called ===")
-    logger.info(f"Player name: {player_name}")
+    logger.info("=== start_game called ===")
+    logger.info("Player name: %s", player_name)
     
     try:
-        session_id = context.agent_session.session_id
-        state = get_game_state(session_id)
+        state = context.userdata
         
-        state["player_name"] = player_name
-        state["phase"] = "ready_for_scenario"
+        state.player_name = player_name
+        state.phase = "ready_for_scenario"
         
-        save_session(session_id)
+        await save_session(state)
         
         return f"Great to have you here, {player_name}! Let me set up your first improv scenario."
         
     except Exception as e:
-        logger.error(f"ERROR in start_game: {str(e)}", exc_info=True)
+        logger.error("ERROR in start_game: %s", e, exc_info=True)
         return f"Error starting game: {str(e)}"
 
 
 @function_tool()
-async def next_scenario(context: RunContext) -> str:
+async def next_scenario(context: RunContext[GameState]) -> str:
     """Get the next improv scenario for the player"""
     
-    logger.info(f"=== next_scenario called ===")
+    logger.info("=== next_scenario called ===")
     
     try:
-        session_id = context.agent_session.session_id
-        state = get_game_state(session_id)
+        state = context.userdata
         
-        if state["current_round"] >= state["max_rounds"]:
+        if state.current_round >= state.max_rounds:
             return "game_complete"
         
-        # Select random unused scenario
-        used_scenarios = [r.get("scenario") for r in state["rounds"]]
-        available = [s for s in SCENARIOS if s not in used_scenarios]
-        
-        if not available:
-            available = SCENARIOS
-        
-        scenario = random.choice(available)
+        scenario = state.scenario_order[state.current_round]
         
-        state["current_round"] += 1
-        state["current_scenario"] = scenario
-        state["phase"] = "awaiting_improv"
+        state.current_round += 1
+        state.current_scenario = scenario
+        state.phase = "awaiting_improv"
         
-        save_session(session_id)
+        await save_session(state)
         
-        round_num = state["current_round"]
-        return f"Round {round_num} of {state['max_rounds']}: {scenario} Go ahead and act it out!"
+        round_num = state.current_round
+        return f"Round {round_num} of {state.max_rounds}: {scenario} Go ahead and act it out!"
         
     except Exception as e:
-        logger.error(f"ERROR in next_scenario: {str(e)}", exc_info=True)
+        logger.error("ERROR in next_scenario: %s", e, exc_info=True)
         return f"Error getting scenario: {str(e)}"
 
 
 @function_tool()
 async def scene_complete(
-    context: RunContext,
+    context: RunContext[GameState],
     performance_summary: Annotated[str, "Brief summary of what the player did in their improv"]
 ) -> str:
     """Mark scene as complete and generate host reaction"""
     
-    logger.info(f"=== scene_complete called ===")
-    logger.info(f"Performance summary: {performance_summary}")
+    logger.info("=== scene_complete called ===")
+    logger.info("Performance summary: %s", performance_summary)
     
     try:
-        session_id = context.agent_session.session_id
-        state = get_game_state(session_id)
+        state = context.userdata
         
         # Generate reaction tone (varied)
-        reaction_styles = [
-            "positive_enthusiastic",
-            "positive_mild", 
-            "critical_constructive",
-            "mixed",
-            "surprised"
-        ]
-        reaction_style = random.choice(reaction_styles)
+        reaction_style = random.choice(REACTION_STYLES)
         
         # Store round data
-        round_data = {
-            "round_number": state["current_round"],
-            "scenario": state["current_scenario"],
-            "performance_summary": performance_summary,
-            "reaction_style": reaction_style
-        }
+        round_data = RoundResult(
+            round_number=state.current_round,
+            scenario=state.current_scenario,
+            performance_summary=performance_summary,
+            reaction_style=reaction_style,
+        )
         
-        state["rounds"].append(round_data)
-        state["phase"] = "reacting"
+        state.rounds.append(round_data)
+        state.phase = "reacting"
         
-        save_session(session_id)
+        await save_session(state)
         
         # Return signal for host to generate appropriate reaction
         return f"reaction_needed|{reaction_style}|{performance_summary}"
         
     except Exception as e:
-        logger.error(f"ERROR in scene_complete: {str(e)}", exc_info=True)
+        logger.error("ERROR in scene_complete: %s", e, exc_info=True)
         return f"Error completing scene: {str(e)}"
 
 
 @function_tool()
-async def end_game(context: RunContext) -> str:
+async def end_game(context: RunContext[GameState]) -> str:
     """End the game early if player wants to stop"""
     
-    logger.info(f"=== end_game called ===")
+    logger.info("=== end_game called ===")
     
     try:
-        session_id = context.agent_session.session_id
-        state = get_game_state(session_id)
+        state = context.userdata
         
-        state["phase"] = "done"
-        save_session(session_id)
+        state.phase = "done"
+        await save_session(state)
         
         return "early_exit_confirmed"
         
     except Exception as e:
-        logger.error(f"ERROR in end_game: {str(e)}", exc_info=True)
+        logger.error("ERROR in end_game: %s", e, exc_info=True)
         return f"Error ending game: {str(e)}"
 
 
 @function_tool()
-async def get_game_summary(context: RunContext) -> str:
+async def get_game_summary(context: RunContext[GameState]) -> str:
     """Get summary of all rounds for closing"""
     
-    logger.info(f"=== get_game_summary called ===")
+    logger.info("=== get_game_summary called ===")
     
     try:
-        session_id = context.agent_session.session_id
-        state = get_game_state(session_id)
+        state = context.userdata
         
-        if not state["rounds"]:
+        if not state.rounds:
             return "No rounds completed yet."
         
-        summary = f"Game Summary for {state['player_name']}:\n\n"
-        
-        for i, round_data in enumerate(state["rounds"], 1):
-            summary += f"Round {i}: {round_data['scenario'][:50]}...\n"
-            summary += f"Style: {round_data['reaction_style']}\n\n"
-        
-        summary += f"Total rounds: {len(state['rounds'])}"
+        # Build the pieces first and join once instead of growing a string
+        sections = [f"Game Summary for {state.player_name}:\n"]
+        sections.extend(
+            f"Round {i}: {round_data.scenario[:50]}...\nStyle: {round_data.reaction_style}\n"
+            for i, round_data in enumerate(state.rounds, 1)
+        )
+        sections.append(f"Total rounds: {len(state.rounds)}")
         
-        return summary
+        return "\n".join(sections)
         
     except Exception as e:
-        logger.error(f"ERROR in get_game_summary: {str(e)}", exc_info=True)
+        logger.error("ERROR in get_game_summary: %s", e, exc_info=True)
         return f"Error getting summary: {str(e)}"
 
 
-class ImprovBattleAgent(Agent):
-    """Improv Battle Game Show Host"""
-    
-    def __init__(self) -> None:
-        super().__init__(
-            instructions="""You are the host of a TV improv show called 'Improv Battle'.
+# Host prompt - built once at import so every session sends an identical prefix
+HOST_INSTRUCTIONS = """You are the host of a TV improv show called 'Improv Battle'.
 
 YOUR ROLE:
 - High-energy, witty, and clear about rules
-- React realistically to player performances (not always supportive)
-- Mix praise, constructive critique, and light teasing
-- Stay respectful and safe, never abusive
-
-YOUR TOOLS:
-1. start_game(player_name) - Register player and begin
-2. next_scenario() - Get next improv scenario  
-3. scene_complete(performance_summary) - Mark scene done, trigger reaction
-4. get_game_summary() - Get all rounds for closing
-5. end_game() - End early if player wants to stop
+- React honestly to performances: mix praise, constructive critique, and light teasing - not always positive
+- Stay respectful and safe, never mean or abusive
 
-GAME FLOW:
+GAME FLOW (3 rounds maximum):
 
 INTRO PHASE:
-- Welcome enthusiastically: "Welcome to IMPROV BATTLE! I'm your host!"
-- Ask for their name
-- When they give name, call start_game(player_name)
-- Explain rules briefly: "You'll get 3 improv scenarios. Act them out, I'll react, then we move on!"
-- Call next_scenario() to begin Round 1
-
-SCENARIO PHASE (repeat 3 times):
-- Call next_scenario() to get the scenario
-- The tool returns: "Round X of 3: SCENARIO TEXT Go ahead and act it out!"
-- Read the EXACT scenario text from the tool and announce it to the player
-- DO NOT make up your own scenarios - ONLY use what next_scenario() returns
-- Tell them to start improvising
+- The show opens with a fixed greeting that asks for their name - don't repeat it
+- When they give their name, call start_game(player_name)
+- Explain rules briefly: "You'll get 3 improv scenarios. Act them out, I'll react, then we move on!", then call next_scenario() to begin Round 1
+
+SCENARIO PHASE:
+- Call next_scenario(); it returns "Round X of 3: SCENARIO TEXT Go ahead and act it out!"
+- Announce the EXACT scenario text it returns - never make up your own
 - Listen silently while they perform - DO NOT interrupt
 - When they clearly finish (say "end scene", long pause, or ask to move on):
   * Summarize what they did in 1-2 sentences
-  * Call scene_complete(performance_summary)
-  * The tool returns: "reaction_needed|STYLE|summary"
+  * Call scene_complete(performance_summary); it returns "reaction_needed|STYLE|summary"
 
 REACTION PHASE:
-- Based on STYLE from scene_complete:
+- Match STYLE from scene_complete:
   * positive_enthusiastic: "That was HILARIOUS! The way you did that was amazing!"
   * positive_mild: "Nice work, I liked your approach there."
   * critical_constructive: "That felt a bit rushed. You could have developed it more."
   * mixed: "Interesting choice! The first part was great but the second could be stronger."
   * surprised: "Wow, I did NOT expect you to go that direction!"
-
-- Keep reactions SHORT (2-3 sentences max)
 - Be specific about what they did
-- Vary your tone - not always positive!
-- After reacting, if rounds remain, call next_scenario()
+- Then move on: next_scenario() if rounds remain, otherwise closing
 
 CLOSING PHASE (after 3 rounds):
 - Call get_game_summary()
@@ -299,27 +333,37 @@ CLOSING PHASE (after 3 rounds):
 - Thank them: "Thanks for playing Improv Battle!"
 
 EARLY EXIT:
-- If they say "stop game", "end show", "I'm done":
-  * Call end_game()
-  * Give brief closing and thank them
+- If they say "stop game", "end show", "I'm done": call end_game(), then give a brief closing and thank them
 
 CRITICAL RULES:
 - Keep ALL responses SHORT (1-3 sentences) except intro and closing
 - NEVER use square brackets in your speech - speak naturally
-- DO NOT narrate your actions or thoughts
-- React authentically - sometimes critical, sometimes amazed
-- Never be mean, but honest feedback is good
-- After each reaction, move forward (next scenario or closing)
-- Maximum 3 rounds total
+- DO NOT narrate your actions or thoughts"""
+
+# Opening line is always the same, so it is spoken directly instead of generated
+HOST_GREETING = "Welcome to IMPROV BATTLE! I'm your host! Before we start, what's your name?"
 
-Start by greeting them enthusiastically!""",
+
+class ImprovBattleAgent(Agent):
+    """Improv Battle Game Show Host"""
+    
+    def __init__(self) -> None:
+        super().__init__(
+            instructions=HOST_INSTRUCTIONS,
             tools=[start_game, next_scenario, scene_complete, get_game_summary, end_game]
         )
+    
+    async def on_enter(self) -> None:
+        # Canned greeting - no LLM round trip before the player hears the host
+        self.session.say(HOST_GREETING)
 
 
 def prewarm(proc: JobProcess):
-    """Prewarm process with VAD model"""
+    """Prewarm process with VAD model and session storage"""
     proc.userdata["vad"] = silero.VAD.load()
+    # Sentence tokenizer is stateless config, so one instance serves every session
+    proc.userdata["tts_tokenizer"] = tokenize.basic.SentenceTokenizer(min_sentence_len=8)
+    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
 
 
 async def entrypoint(ctx: JobContext):
@@ -331,6 +375,8 @@ async def entrypoint(ctx: JobContext):
     
     # Create agent session
     session = AgentSession(
+        # Suffix the room name so a reused room never overwrites an earlier game's file
+        userdata=GameState(f"{ctx.room.name}_{time.time_ns()}"),
         stt=deepgram.STT(model="nova-3"),
         llm=google.LLM(
             model="gemini-2.0-flash-lite",
@@ -339,7 +385,7 @@ async def entrypoint(ctx: JobContext):
         tts=murf.TTS(
             voice="en-IN-priya", 
             style="Conversation",
-            tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=8)
+            tokenizer=ctx.proc.userdata["tts_tokenizer"]
         ),
         turn_detection=MultilingualModel(),
         vad=ctx.proc.userdata["vad"],
@@ -351,15 +397,15 @@ async def entrypoint(ctx: JobContext):
     
     @session.on("user_speech_committed")
     def on_user_speech(msg):
-        logger.info(f"USER SAID: {msg.text}")
+        logger.info("USER SAID: %s", msg.text)
     
     @session.on("agent_speech_committed")
     def on_agent_speech(msg):
-        logger.info(f"AGENT SAID: {msg.text}")
+        logger.info("AGENT SAID: %s", msg.text)
     
     @session.on("function_calls_collected")
     def on_function_calls(calls):
-        logger.info(f"FUNCTION CALLS: {[call.function_info.name for call in calls.function_calls]}")
+        logger.info("FUNCTION CALLS: %s", [call.function_info.name for call in calls.function_calls])
     
     @session.on("metrics_collected")
     def _on_metrics_collected(ev: MetricsCollectedEvent):
@@ -368,7 +414,7 @@ async def entrypoint(ctx: JobContext):
     
     async def log_usage():
         summary = usage_collector.get_summary()
-        logger.info(f"Session Usage Summary: {summary}")
+        logger.info("Session Usage Summary: %s", summary)
     
     ctx.add_shutdown_callback(log_usage)
     
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import agent
+from agent import SCENARIOS, GameState, RoundResult, next_scenario, save_session
+
+
+@pytest.fixture
+def sessions_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(agent, "SESSIONS_DIR", tmp_path)
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_concurrent_saves_keep_newest_snapshot(sessions_dir, monkeypatch) -> None:
+    """A slow earlier save must not overwrite a later one for the same game."""
+    write_session = agent._write_session
+
+    def slow_first_write(filepath, payload):
+        if '"player_name":"Slow"' in payload:
+            time.sleep(0.2)
+        write_session(filepath, payload)
+
+    monkeypatch.setattr(agent, "_write_session", slow_first_write)
+
+    state = GameState("room_1")
+    state.player_name = "Slow"
+    first = asyncio.create_task(save_session(state))
+    await asyncio.sleep(0)
+
+    state.player_name = "Asha"
+    await asyncio.gather(first, save_session(state))
+
+    saved = json.loads((sessions_dir / "session_room_1.json").read_text(encoding="utf-8"))
+    assert saved["player_name"] == "Asha"
+
+
+def test_game_snapshot_keys() -> None:
+    """Session files keep the original key order and leave in-memory fields out."""
+    snapshot = GameState("room_1").to_dict()
+    assert list(snapshot) == [
+        "player_name",
+        "current_round",
+        "max_rounds",
+        "rounds",
+        "phase",
+        "current_scenario",
+        "session_start",
+    ]
+    assert "scenario_order" not in snapshot
+    assert "session_id" not in snapshot
+
+
+def test_round_snapshot_keys() -> None:
+    """Round entries keep the original key order."""
+    state = GameState("room_1")
+    state.rounds.append(RoundResult(1, "A scene", "Bold choices", "supportive"))
+    assert state.to_dict()["rounds"] == [
+        {
+            "round_number": 1,
+            "scenario": "A scene",
+            "performance_summary": "Bold choices",
+            "reaction_style": "supportive",
+        }
+    ]
+    assert list(state.to_dict()["rounds"][0]) == list(RoundResult.PERSISTED_FIELDS)
+    assert list(RoundResult.PERSISTED_FIELDS) == [
+        "round_number",
+        "scenario",
+        "performance_summary",
+        "reaction_style",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_game_draws_distinct_scenarios_then_completes(sessions_dir) -> None:
+    """Each round gets a different scenario until max_rounds is reached."""
+    state = GameState("room_1", max_rounds=len(SCENARIOS))
+    context = SimpleNamespace(userdata=state)
+
+    drawn = []
+    for round_num in range(1, state.max_rounds + 1):
+        reply = await next_scenario(context)
+        assert reply.startswith(f"Round {round_num} of {state.max_rounds}: ")
+        drawn.append(state.current_scenario)
+
+    assert sorted(drawn) == sorted(SCENARIOS)
+    assert await next_scenario(context) == "game_complete"
+
+
+@pytest.mark.parametrize("max_rounds", [0, len(SCENARIOS) + 1])
+def test_max_rounds_must_fit_scenarios(max_rounds) -> None:
+    """A game can't ask for more rounds than there are distinct scenarios."""
+    with pytest.raises(ValueError):
+        GameState("room_1", max_rounds=max_rounds)